@@ -38,8 +38,19 @@ pub fn build(b: *std.Build) void {
         .target = target,
         .optimize = optimize,
     });
-    daemon.linkLibC();
-    daemon.root_module.addImport("lib", lib);
+    data.linkLibC();
+
+    // 单元测试
+    const lib_tests = b.addTest(.{
+        .root_source_file = b.path("src/lib.zig"),
+        .target = target,
+        .optimize = optimize,
+    });
+    lib_tests.linkLibC();
+
+    const run_lib_tests = b.addRunArtifact(lib_tests);
+    const test_step = b.step("test", "Run unit tests.");
+    test_step.dependOn(&run_lib_tests.step);
 
     const check = b.step("check", "Chech the code.");
     check.dependOn(&daemon.step);
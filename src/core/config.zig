@@ -1,4 +1,5 @@
 const std = @import("std");
+const FsyncPolicy = @import("../model/recorder.zig").FsyncPolicy;
 
 pub const TransitionType = enum {
     Linear,
@@ -30,6 +31,7 @@ pub const BrightnessConfig = struct {
     activity_timeout: i64 = 300, // 5分钟无操作视为不活跃
     update_interval_ms: i64 = 50,
     transition_duration_ms: u64 = 2000,
+    data_fsync_policy: FsyncPolicy = .{ .interval = 1 },
 
     // 平滑过渡设置
     transition_enabled: bool = true,
@@ -29,10 +29,11 @@ pub const BrightnessController = struct {
             logger.err("初始化环境光传感器失败: {}", .{err}) catch {};
             return err;
         };
-        var data_logger = DataLogger.init(allocator) catch |err| {
+        var data_logger = DataLogger.init(allocator, config.data_fsync_policy) catch |err| {
             logger.err("初始化数据记录器失败: {}", .{err}) catch {};
             return err;
         };
+        errdefer data_logger.deinit();
         screen.setTransitionConfig(config.transition_duration_ms, 30);
         logger.debug("已配置亮度过渡: 持续时间={}ms, 步数={}", .{ config.transition_duration_ms, 30 }) catch {};
 
@@ -49,11 +50,12 @@ pub const BrightnessController = struct {
         };
 
         logger.info("正在读取历史数据...", .{}) catch {};
-        const historical_data = data_logger.readHistoricalData() catch |err| {
+        var historical_list = data_logger.readHistoricalData() catch |err| {
             logger.err("读取历史数据失败: {}", .{err}) catch {};
             return err;
         };
-        defer allocator.free(historical_data);
+        defer historical_list.deinit(allocator);
+        const historical_data = historical_list.slice();
         logger.info("已读取 {} 条历史数据", .{historical_data.len}) catch {};
 
         // 初始化增强亮度模型
@@ -70,20 +72,12 @@ pub const BrightnessController = struct {
         logger.info("亮度模型已初始化: 环境光范围=[{}, {}], 分箱数={}", .{ config.min_ambient_light, config.max_ambient_light, config.bin_count }) catch {};
 
         // 自适应分箱
-        model.adaptBins(historical_data) catch |err| {
+        model.adaptBins(historical_data.items(.ambient_light)) catch |err| {
             logger.err("自适应分箱失败: {}", .{err}) catch {};
         };
 
         // 训练模型
-        const current_time = std.time.timestamp();
-        var trained_count: usize = 0;
-        for (historical_data) |data_point| {
-            const is_active = (current_time - data_point.timestamp) < config.activity_timeout;
-            model.train(data_point, current_time, is_active) catch |err| {
-                logger.err("训练数据点失败: {}", .{err}) catch {};
-            };
-            trained_count += 1;
-        }
+        const trained_count = model.trainBatch(historical_data, std.time.timestamp());
         logger.info("模型训练完成，成功训练数据点: {}/{}", .{ trained_count, historical_data.len }) catch {};
 
         controller.model = model;
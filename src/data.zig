@@ -10,18 +10,27 @@ const Point = struct {
 
 pub fn main() !void {
     const config = try Config.load();
-    const model = Model.init(std.heap.page_allocator, config, config.min_ambient_light, config.max_ambient_light, config.bin_count) catch |err| {
+    var model = Model.init(std.heap.page_allocator, config, config.min_ambient_light, config.max_ambient_light, config.bin_count) catch |err| {
         std.debug.print("初始化模型失败：{s}\n", .{@errorName(err)});
         return err;
     };
+    defer model.deinit();
 
     var data = std.ArrayList(Point).init(std.heap.page_allocator);
     defer data.deinit();
 
-    for (0..23333) |i| {
-        if (model.predict(@as(i64, @intCast(i)), true)) |result| {
-            try data.append(Point{ .x = @as(i64, @intCast(i)), .y = result });
-        } else {}
+    const sample_count = 23333;
+    const ambient_lights = try std.heap.page_allocator.alloc(i64, sample_count);
+    defer std.heap.page_allocator.free(ambient_lights);
+    const results = try std.heap.page_allocator.alloc(?i64, sample_count);
+    defer std.heap.page_allocator.free(results);
+    for (ambient_lights, 0..) |*ambient, i| ambient.* = @as(i64, @intCast(i));
+
+    model.predictMany(ambient_lights, true, results);
+    for (ambient_lights, results) |ambient, result| {
+        if (result) |brightness| {
+            try data.append(Point{ .x = ambient, .y = brightness });
+        }
     }
 
     std.log.debug("Data points:", .{});
@@ -17,3 +17,7 @@ pub const model = struct {
 pub const ipc = struct {
     pub const IpcServer = @import("ipc/server.zig").IpcServer;
 };
+
+test {
+    std.testing.refAllDeclsRecursive(@This());
+}
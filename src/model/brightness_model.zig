@@ -2,13 +2,18 @@ const std = @import("std");
 const time = @import("std").time;
 const DataPoint = @import("../model/recorder.zig").DataPoint;
 const Config = @import("../core/config.zig").BrightnessConfig;
+const c = @cImport(@cInclude("time.h"));
 
-pub const TimeFeatures = struct {
-    hour: u8,
+/// 时间特征，打包为单个字节按值传递
+pub const TimeFeatures = packed struct(u8) {
+    hour: u5,
     is_day: bool,
+    _padding: u2 = 0,
 
-    pub fn fromTimestamp(timestamp: i64) TimeFeatures {
-        const hour = @as(u8, @intCast(@mod(@divFloor(timestamp, 3600), 24)));
+    /// utc_offset 为本地时区相对 UTC 的偏移（秒），见 `localUtcOffset`
+    pub fn fromTimestamp(timestamp: i64, utc_offset: i64) TimeFeatures {
+        const seconds_of_day = @mod(timestamp + utc_offset, 24 * 3600);
+        const hour: u5 = @intCast(@divTrunc(seconds_of_day, 3600));
         // 简单判断白天：6点到18点
         const is_day = hour >= 6 and hour < 18;
         return .{
@@ -18,64 +23,179 @@ pub const TimeFeatures = struct {
     }
 };
 
+/// 通过 libc 的 localtime_r 获取指定时刻的本地时区偏移（秒），失败时按 UTC 处理。
+/// 由 libc 负责处理 $TZ、/etc/localtime 以及 zoneinfo 中最后一次跳变之后的规则（夏令时）。
+/// 模型每隔一刻钟调用一次，其余时候的小时计算都是纯整数运算。
+fn localUtcOffset(timestamp: i64) i64 {
+    const t: c.time_t = std.math.cast(c.time_t, timestamp) orelse return 0;
+    var tm: c.struct_tm = undefined;
+    c.tzset();
+    if (c.localtime_r(&t, &tm) == null) return 0;
+    return tm.tm_gmtoff;
+}
+
 pub const WeightedDataPoint = struct {
     brightness: i64,
     weight: f64,
     timestamp: i64,
 };
 
+/// 光照区间，数据点按列（SoA）存放在定长数组中。
+/// 数组按 (权重, 插入序号) 组织成最小堆，淘汰权重最小的点只需 O(log n)。
 pub const AdaptiveBin = struct {
+    pub const max_points = 50;
+
     min_value: i64,
     max_value: i64,
-    points: std.ArrayList(WeightedDataPoint),
-    total_weight: f64,
-
-    pub fn init(allocator: std.mem.Allocator, min: i64, max: i64) AdaptiveBin {
+    brightness: [max_points]i64 = undefined,
+    weights: [max_points]f64 = undefined,
+    timestamps: [max_points]i64 = undefined,
+    /// 插入序号，由调用者分配且单调递增；权重相同时先淘汰较早加入的点
+    sequences: [max_points]u64 = undefined,
+    len: usize = 0,
+    total_weight: f64 = 0,
+    /// brightness * weight 的累加和，随数据点增删增量维护
+    weighted_sum: f64 = 0,
+    /// 时间戳最新的数据点及其插入序号，随插入增量维护
+    latest: ?WeightedDataPoint = null,
+    latest_sequence: u64 = 0,
+
+    pub fn init(min: i64, max: i64) AdaptiveBin {
         return .{
             .min_value = min,
             .max_value = max,
-            .points = std.ArrayList(WeightedDataPoint).init(allocator),
-            .total_weight = 0,
         };
     }
 
-    pub fn deinit(self: *AdaptiveBin) void {
-        self.points.deinit();
-    }
-
-    pub fn update(self: *AdaptiveBin, brightness: i64, weight: f64) !void {
-        try self.points.append(.{
+    /// sequence 为插入序号，BrightnessModel 在所有区间间统一分配，
+    /// 以便比较不同区间中时间戳相同的点哪个较晚加入
+    pub fn update(self: *AdaptiveBin, brightness: i64, weight: f64, timestamp: i64, sequence: u64) void {
+        const point = WeightedDataPoint{
             .brightness = brightness,
             .weight = weight,
-            .timestamp = std.time.timestamp(),
-        });
+            .timestamp = timestamp,
+        };
+
+        var evicted_latest = false;
+        if (self.len < max_points) {
+            self.set(self.len, point, sequence);
+            self.len += 1;
+            self.siftUp(self.len - 1);
+        } else {
+            // 区间已满时替换堆顶（权重最小的点）；新点权重最小则直接丢弃
+            if (weight < self.weights[0]) return;
+            self.total_weight -= self.weights[0];
+            self.weighted_sum -= @as(f64, @floatFromInt(self.brightness[0])) * self.weights[0];
+            evicted_latest = self.sequences[0] == self.latest_sequence;
+            self.set(0, point, sequence);
+            self.siftDown(0);
+        }
+
         self.total_weight += weight;
+        self.weighted_sum += @as(f64, @floatFromInt(brightness)) * weight;
 
-        // 如果数据点过多，移除权重最小的点
-        if (self.points.items.len > 50) {
-            var min_weight_idx: usize = 0;
-            var min_weight = self.points.items[0].weight;
+        if (evicted_latest) {
+            self.refreshLatest();
+        } else if (self.latest == null or timestamp >= self.latest.?.timestamp) {
+            self.latest = point;
+            self.latest_sequence = sequence;
+        }
+    }
 
-            for (self.points.items, 0..) |point, i| {
-                if (point.weight < min_weight) {
-                    min_weight = point.weight;
-                    min_weight_idx = i;
-                }
+    /// 重新扫描得到时间戳最新的数据点，时间戳相同时取较晚加入的点
+    fn refreshLatest(self: *AdaptiveBin) void {
+        self.latest = null;
+        for (0..self.len) |i| {
+            if (self.latest) |latest| {
+                if (self.timestamps[i] < latest.timestamp) continue;
+                if (self.timestamps[i] == latest.timestamp and self.sequences[i] < self.latest_sequence) continue;
             }
+            self.latest = .{
+                .brightness = self.brightness[i],
+                .weight = self.weights[i],
+                .timestamp = self.timestamps[i],
+            };
+            self.latest_sequence = self.sequences[i];
+        }
+    }
+
+    fn set(self: *AdaptiveBin, index: usize, point: WeightedDataPoint, sequence: u64) void {
+        self.brightness[index] = point.brightness;
+        self.weights[index] = point.weight;
+        self.timestamps[index] = point.timestamp;
+        self.sequences[index] = sequence;
+    }
 
-            self.total_weight -= self.points.items[min_weight_idx].weight;
-            _ = self.points.orderedRemove(min_weight_idx);
+    fn less(self: *const AdaptiveBin, a: usize, b: usize) bool {
+        if (self.weights[a] != self.weights[b]) return self.weights[a] < self.weights[b];
+        return self.sequences[a] < self.sequences[b];
+    }
+
+    fn swap(self: *AdaptiveBin, a: usize, b: usize) void {
+        std.mem.swap(i64, &self.brightness[a], &self.brightness[b]);
+        std.mem.swap(f64, &self.weights[a], &self.weights[b]);
+        std.mem.swap(i64, &self.timestamps[a], &self.timestamps[b]);
+        std.mem.swap(u64, &self.sequences[a], &self.sequences[b]);
+    }
+
+    fn siftUp(self: *AdaptiveBin, start: usize) void {
+        var child = start;
+        while (child > 0) {
+            const parent = (child - 1) / 2;
+            if (!self.less(child, parent)) break;
+            self.swap(child, parent);
+            child = parent;
         }
     }
 
+    fn siftDown(self: *AdaptiveBin, start: usize) void {
+        var parent = start;
+        while (true) {
+            var smallest = parent;
+            const left = 2 * parent + 1;
+            const right = left + 1;
+            if (left < self.len and self.less(left, smallest)) smallest = left;
+            if (right < self.len and self.less(right, smallest)) smallest = right;
+            if (smallest == parent) break;
+            self.swap(parent, smallest);
+            parent = smallest;
+        }
+    }
+
+    /// 时间戳最新的数据点
+    pub fn latestPoint(self: *const AdaptiveBin) ?WeightedDataPoint {
+        return self.latest;
+    }
+
     pub fn getWeightedAverage(self: *const AdaptiveBin) ?f64 {
-        if (self.points.items.len == 0) return null;
+        if (self.len == 0) return null;
+        return self.weighted_sum / self.total_weight;
+    }
 
-        var sum: f64 = 0;
-        for (self.points.items) |point| {
-            sum += @as(f64, @floatFromInt(point.brightness)) * point.weight;
+    /// 移除超过 max_age 秒的数据点，并重建堆
+    pub fn cleanup(self: *AdaptiveBin, current_timestamp: i64, max_age: i64) void {
+        // 顺便根据剩余数据点重新计算累加值，消除增量维护带来的浮点误差
+        var kept: usize = 0;
+        self.total_weight = 0;
+        self.weighted_sum = 0;
+        for (0..self.len) |i| {
+            if (current_timestamp - self.timestamps[i] > max_age) continue;
+            self.brightness[kept] = self.brightness[i];
+            self.weights[kept] = self.weights[i];
+            self.timestamps[kept] = self.timestamps[i];
+            self.sequences[kept] = self.sequences[i];
+            self.total_weight += self.weights[i];
+            self.weighted_sum += @as(f64, @floatFromInt(self.brightness[i])) * self.weights[i];
+            kept += 1;
+        }
+        self.len = kept;
+        self.refreshLatest();
+
+        var i = self.len / 2;
+        while (i > 0) {
+            i -= 1;
+            self.siftDown(i);
         }
-        return sum / self.total_weight;
     }
 };
 
@@ -83,11 +203,34 @@ pub const AdaptiveBin = struct {
 pub const BrightnessModel = struct {
     allocator: std.mem.Allocator,
     ambient_bins: []AdaptiveBin,
+    /// 各区间的下边界，用于二分查找；区间边界变化后需调用 `updateBinEdges`
+    bin_edges: []i64,
+    /// 各区间宽度的倒数，宽度为 0 的区间记为 0
+    bin_inv_widths: []f64,
     time_weight: f64,
     recency_weight: f64,
     config: Config,
     activity_weight: f64,
-    last_predictions: [3]f64 = .{ 0, 0, 0 },
+    utc_offset: i64,
+    /// 到达该时刻后重新获取 utc_offset，以跟上夏令时等时区切换
+    utc_offset_expires: i64,
+    /// 全模型统一的插入计数，作为各区间数据点的插入序号
+    next_sequence: u64 = 0,
+    /// 所有区间中最新的数据点及其插入序号和所在区间，随训练增量维护
+    latest: ?WeightedDataPoint = null,
+    latest_sequence: u64 = 0,
+    latest_bin: usize = 0,
+    /// ln(config.max_ambient_light)，对数映射的分母
+    log_max_ambient: f64,
+    /// 最近几次预测值的环形缓冲区及其累加和，用于滑动平均
+    last_predictions: [smoothing_window]f64 = .{0} ** smoothing_window,
+    last_prediction_index: usize = 0,
+    last_predictions_sum: f64 = 0,
+
+    const smoothing_window = 3;
+
+    /// 重新获取本地时区偏移的间隔（秒）。时区切换基本都发生在整刻钟，按整刻钟刷新即可
+    const utc_offset_refresh_interval = 15 * 60;
 
     const default_time_weight = 0.3;
     const default_recency_weight = 0.4;
@@ -101,28 +244,39 @@ pub const BrightnessModel = struct {
         bin_count: usize,
     ) !BrightnessModel {
         var bins = try allocator.alloc(AdaptiveBin, bin_count);
+        errdefer allocator.free(bins);
         const bin_size = @divFloor(max_ambient - min_ambient, @as(i64, @intCast(bin_count)));
 
         for (0..bin_count) |i| {
             const bin_min = min_ambient + @as(i64, @intCast(i)) * bin_size;
             const bin_max = if (i == bin_count - 1) max_ambient else bin_min + bin_size;
-            bins[i] = AdaptiveBin.init(allocator, bin_min, bin_max);
+            bins[i] = AdaptiveBin.init(bin_min, bin_max);
         }
 
-        return .{
+        const bin_edges = try allocator.alloc(i64, bin_count);
+        errdefer allocator.free(bin_edges);
+        const bin_inv_widths = try allocator.alloc(f64, bin_count);
+
+        var model = BrightnessModel{
             .allocator = allocator,
             .config = config,
             .ambient_bins = bins,
+            .bin_edges = bin_edges,
+            .bin_inv_widths = bin_inv_widths,
             .time_weight = default_time_weight,
             .recency_weight = default_recency_weight,
             .activity_weight = default_activity_weight,
+            .utc_offset = 0,
+            .utc_offset_expires = std.math.minInt(i64),
+            .log_max_ambient = @log(@as(f64, @floatFromInt(config.max_ambient_light))),
         };
+        model.updateBinEdges();
+        return model;
     }
 
     pub fn deinit(self: *BrightnessModel) void {
-        for (self.ambient_bins) |*bin| {
-            bin.deinit();
-        }
+        self.allocator.free(self.bin_inv_widths);
+        self.allocator.free(self.bin_edges);
         self.allocator.free(self.ambient_bins);
     }
 
@@ -135,24 +289,61 @@ pub const BrightnessModel = struct {
     }
 
     /// 自适应分箱（基于历史数据分位数）
-    pub fn adaptBins(self: *BrightnessModel, historical: []DataPoint) !void {
-        if (historical.len < 10) return; // 数据太少不自适应
-        var ambient_list = try self.allocator.alloc(i64, historical.len);
+    pub fn adaptBins(self: *BrightnessModel, historical_ambient: []const i64) !void {
+        if (historical_ambient.len < 10) return; // 数据太少不自适应
+        const ambient_list = try self.allocator.dupe(i64, historical_ambient);
         defer self.allocator.free(ambient_list);
-        for (historical, 0..) |d, i| ambient_list[i] = d.ambient_light;
-        std.sort.heap(i64, ambient_list, {}, std.sort.asc(i64));
+        std.mem.sortUnstable(i64, ambient_list, {}, std.sort.asc(i64));
+        // 以分位点作为区间边界，相邻区间首尾相接。重复值较多时分位点会重合，
+        // 此时把边界依次加一，保证边界严格递增，不出现无法命中的空区间。
         const bin_count = self.ambient_bins.len;
+        var lower = ambient_list[0];
         for (self.ambient_bins, 0..) |*bin, i| {
-            const start_idx = @divTrunc(i * ambient_list.len, bin_count);
-            const end_idx = @divTrunc((i + 1) * ambient_list.len, bin_count) - 1;
-            bin.min_value = ambient_list[start_idx];
-            bin.max_value = ambient_list[@min(end_idx, ambient_list.len - 1)];
+            const upper = if (i + 1 == bin_count)
+                ambient_list[ambient_list.len - 1]
+            else
+                ambient_list[@divTrunc((i + 1) * ambient_list.len, bin_count)];
+            bin.min_value = lower;
+            bin.max_value = @max(upper, lower + 1);
+            lower = bin.max_value;
+        }
+        self.updateBinEdges();
+    }
+
+    fn updateBinEdges(self: *BrightnessModel) void {
+        for (self.ambient_bins, self.bin_edges, self.bin_inv_widths) |bin, *edge, *inv_width| {
+            edge.* = bin.min_value;
+            const width = bin.max_value - bin.min_value;
+            inv_width.* = if (width > 0) 1.0 / @as(f64, @floatFromInt(width)) else 0;
         }
     }
 
-    /// 非线性环境光映射（sigmoid）
-    fn nonlinearMap(ambient: i64) f64 {
-        return 1.0 / (1.0 + std.math.exp(-@as(f64, @floatFromInt(ambient)) / 300.0));
+    /// 二分查找数值所在的区间。区间之间的空隙归入左侧区间，
+    /// 超出范围的值归入首尾区间，保证训练数据都能落入某个区间。
+    fn findBinIndex(self: *const BrightnessModel, value: f64) usize {
+        const upper = std.sort.partitionPoint(i64, self.bin_edges, value, struct {
+            fn notAbove(v: f64, edge: i64) bool {
+                return @as(f64, @floatFromInt(edge)) <= v;
+            }
+        }.notAbove);
+        return if (upper == 0) 0 else upper - 1;
+    }
+
+    /// 与 `findBinIndex` 相同，但数值超出 [首区间下界, 末区间上界) 时返回 null
+    fn findBinIndexInRange(self: *const BrightnessModel, value: f64) ?usize {
+        const last_bin = self.ambient_bins[self.ambient_bins.len - 1];
+        if (value < @as(f64, @floatFromInt(self.bin_edges[0])) or
+            value >= @as(f64, @floatFromInt(last_bin.max_value))) return null;
+        return self.findBinIndex(value);
+    }
+
+    /// 非线性环境光映射（sigmoid）。参数可以是 f64 或 @Vector(n, f64)，
+    /// 向量形式一次处理多个环境光值。exp 溢出为 inf 时结果为 0，无需额外截断。
+    fn nonlinearMap(ambient: anytype) @TypeOf(ambient) {
+        const T = @TypeOf(ambient);
+        const one: T = if (@typeInfo(T) == .vector) @splat(1.0) else 1.0;
+        const scale: T = if (@typeInfo(T) == .vector) @splat(300.0) else 300.0;
+        return one / (one + @exp(-ambient / scale));
     }
 
     fn calculateWeight(
@@ -181,96 +372,196 @@ pub const BrightnessModel = struct {
         return time_weight + recency_weight + activity_weight;
     }
 
-    pub fn train(
+    /// 异常点判断所参照的上一个数据点：所有区间中时间戳最新的点，时间戳相同时取较晚加入的点
+    fn latestPoint(self: *const BrightnessModel) ?DataPoint {
+        const point = self.latest orelse return null;
+        return DataPoint{
+            .timestamp = point.timestamp,
+            .ambient_light = point.brightness, // 近似
+            .screen_brightness = point.brightness,
+            .is_manual_adjustment = true,
+        };
+    }
+
+    /// 遍历各区间缓存的最新点，重新得到全局最新点
+    fn refreshLatest(self: *BrightnessModel) void {
+        self.latest = null;
+        for (self.ambient_bins, 0..) |*bin, i| {
+            const point = bin.latestPoint() orelse continue;
+            if (self.latest) |latest| {
+                if (point.timestamp < latest.timestamp) continue;
+                if (point.timestamp == latest.timestamp and bin.latest_sequence < self.latest_sequence) continue;
+            }
+            self.latest = point;
+            self.latest_sequence = bin.latest_sequence;
+            self.latest_bin = i;
+        }
+    }
+
+    /// 数据点以 sequence 插入第 bin_index 个区间后更新全局最新点。
+    /// 只有缓存的最新点被该区间淘汰时才需要重新遍历所有区间。
+    fn updateLatest(self: *BrightnessModel, bin_index: usize, sequence: u64) void {
+        const bin = &self.ambient_bins[bin_index];
+        if (bin.latest_sequence == sequence) {
+            // 新点已加入且是该区间最新的点；它的序号最大，时间戳不早于缓存即为全局最新
+            const point = bin.latestPoint().?;
+            if (self.latest == null or point.timestamp >= self.latest.?.timestamp) {
+                self.latest = point;
+                self.latest_sequence = sequence;
+                self.latest_bin = bin_index;
+                return;
+            }
+        }
+        // 缓存的最新点若仍在该区间中，必然还是该区间最新的点
+        if (self.latest != null and self.latest_bin == bin_index and bin.latest_sequence != self.latest_sequence) {
+            self.refreshLatest();
+        }
+    }
+
+    /// 训练单个数据点，返回数据点所在区间的下标；被过滤时返回 null
+    fn trainPoint(
         self: *BrightnessModel,
         data_point: DataPoint,
+        last_point: ?DataPoint,
+        current_time: TimeFeatures,
         current_timestamp: i64,
         is_active: bool,
-    ) !void {
-        if (!data_point.is_manual_adjustment) return;
+    ) ?usize {
         // 异常点过滤：只在非异常时训练
-        var last_point: ?DataPoint = null;
-        for (self.ambient_bins) |bin| {
-            if (bin.points.items.len > 0) {
-                last_point = DataPoint{
-                    .timestamp = bin.points.items[bin.points.items.len - 1].timestamp,
-                    .ambient_light = bin.points.items[bin.points.items.len - 1].brightness, // 近似
-                    .screen_brightness = bin.points.items[bin.points.items.len - 1].brightness,
-                    .is_manual_adjustment = true,
-                };
-            }
-        }
-        if (isOutlier(data_point, last_point)) return;
+        if (isOutlier(data_point, last_point)) return null;
 
-        const current_time = TimeFeatures.fromTimestamp(current_timestamp);
-        const point_time = TimeFeatures.fromTimestamp(data_point.timestamp);
+        const point_time = TimeFeatures.fromTimestamp(data_point.timestamp, self.utc_offset);
         const time_diff = current_timestamp - data_point.timestamp;
 
         const weight = self.calculateWeight(current_time, point_time, time_diff, is_active);
 
-        // 找到对应的光照区间
-        for (self.ambient_bins) |*bin| {
-            if (data_point.ambient_light >= bin.min_value and
-                data_point.ambient_light < bin.max_value)
-            {
-                try bin.update(data_point.screen_brightness, weight);
-                break;
+        const bin_index = self.findBinIndex(@floatFromInt(data_point.ambient_light));
+        const sequence = self.next_sequence;
+        self.next_sequence += 1;
+        self.ambient_bins[bin_index].update(data_point.screen_brightness, weight, data_point.timestamp, sequence);
+        self.updateLatest(bin_index, sequence);
+        return bin_index;
+    }
+
+    pub fn train(
+        self: *BrightnessModel,
+        data_point: DataPoint,
+        current_timestamp: i64,
+        is_active: bool,
+    ) !void {
+        if (!data_point.is_manual_adjustment) return;
+        const current_time = self.currentTimeFeatures(current_timestamp);
+        _ = self.trainPoint(data_point, self.latestPoint(), current_time, current_timestamp, is_active);
+    }
+
+    /// 批量训练历史数据，结果与按顺序逐条调用 `train` 相同，返回参与训练的数据点数量
+    pub fn trainBatch(
+        self: *BrightnessModel,
+        points: std.MultiArrayList(DataPoint).Slice,
+        current_timestamp: i64,
+    ) usize {
+        const current_time = self.currentTimeFeatures(current_timestamp);
+        var trained_count: usize = 0;
+        for (0..points.len) |i| {
+            const data_point = points.get(i);
+            if (!data_point.is_manual_adjustment) continue;
+
+            const is_active = (current_timestamp - data_point.timestamp) < self.config.activity_timeout;
+            if (self.trainPoint(data_point, self.latestPoint(), current_time, current_timestamp, is_active) != null) {
+                trained_count += 1;
             }
         }
+        return trained_count;
+    }
+
+    /// 主区间无数据时使用对数映射而不是线性映射，提供更好的低光照响应
+    fn logMapBrightness(self: *const BrightnessModel, ambient_light: i64) i64 {
+        if (ambient_light < 1) return self.config.min_brightness;
+
+        const log_ambient = @log(@as(f64, @floatFromInt(ambient_light)));
+        const brightness_range = @as(f64, @floatFromInt(self.config.max_brightness - self.config.min_brightness));
+        const min_brightness_f = @as(f64, @floatFromInt(self.config.min_brightness));
+        return @as(i64, @intFromFloat((log_ambient / self.log_max_ambient) * brightness_range + min_brightness_f));
     }
 
     pub fn predict(
-        self: *const BrightnessModel,
+        self: *BrightnessModel,
         ambient_light: i64,
         is_active: bool,
     ) ?i64 {
         // 非线性预处理（如需使用 mapped_ambient，可直接替换 ambient_light）
-        const mapped_ambient = nonlinearMap(ambient_light);
-        // 找到主要区间
-        var main_bin: ?*const AdaptiveBin = null;
-        var main_bin_index: usize = 0;
-        for (self.ambient_bins, 0..) |*bin, i| {
-            if (mapped_ambient >= @as(f64, @floatFromInt(bin.min_value)) and mapped_ambient < @as(f64, @floatFromInt(bin.max_value))) {
-                main_bin = bin;
-                main_bin_index = i;
-                break;
+        const mapped_ambient = nonlinearMap(@as(f64, @floatFromInt(ambient_light)));
+        return self.predictMapped(ambient_light, mapped_ambient, self.timeFactor(), activityFactor(is_active));
+    }
+
+    /// 批量预测，结果与依次调用 `predict` 相同（包括滑动平均状态），
+    /// 但时间因子整批只计算一次，非线性映射按 SIMD 向量分块计算。
+    pub fn predictMany(
+        self: *BrightnessModel,
+        ambient_lights: []const i64,
+        is_active: bool,
+        results: []?i64,
+    ) void {
+        std.debug.assert(results.len == ambient_lights.len);
+        const lanes = std.simd.suggestVectorLength(f64) orelse 1;
+        const time_factor = self.timeFactor();
+        const activity_factor = activityFactor(is_active);
+
+        var start: usize = 0;
+        while (start < ambient_lights.len) : (start += lanes) {
+            const block = ambient_lights[start..@min(start + lanes, ambient_lights.len)];
+            var ambient_block: [lanes]f64 = @splat(0);
+            for (block, 0..) |ambient_light, i| ambient_block[i] = @floatFromInt(ambient_light);
+            const mapped_block: [lanes]f64 = nonlinearMap(@as(@Vector(lanes, f64), ambient_block));
+
+            for (block, mapped_block[0..block.len], results[start..][0..block.len]) |ambient_light, mapped_ambient, *result| {
+                result.* = self.predictMapped(ambient_light, mapped_ambient, time_factor, activity_factor);
             }
         }
+    }
 
-        if (main_bin == null) {
-            return null;
+    /// 当前时刻的时间特征。守护进程长期运行，跨过刷新时刻时重新获取本地时区偏移
+    fn currentTimeFeatures(self: *BrightnessModel, current_timestamp: i64) TimeFeatures {
+        if (current_timestamp >= self.utc_offset_expires) {
+            self.utc_offset = localUtcOffset(current_timestamp);
+            self.utc_offset_expires = current_timestamp - @mod(current_timestamp, utc_offset_refresh_interval) +
+                utc_offset_refresh_interval;
         }
+        return TimeFeatures.fromTimestamp(current_timestamp, self.utc_offset);
+    }
+
+    fn timeFactor(self: *BrightnessModel) f64 {
+        const time_features = self.currentTimeFeatures(std.time.timestamp());
+        return if (time_features.is_day) 1.0 else 0.8;
+    }
+
+    fn activityFactor(is_active: bool) f64 {
+        return if (is_active) 1.0 else 0.9;
+    }
+
+    fn predictMapped(
+        self: *BrightnessModel,
+        ambient_light: i64,
+        mapped_ambient: f64,
+        time_factor: f64,
+        activity_factor: f64,
+    ) ?i64 {
+        // 找到主要区间，不在任何区间内时无法预测
+        const main_bin_index = self.findBinIndexInRange(mapped_ambient) orelse return null;
+        const main_bin = &self.ambient_bins[main_bin_index];
 
         // 获取主区间的预测值
-        const main_prediction = main_bin.?.getWeightedAverage() orelse {
-            std.debug.print("主区间无数据，使用对数映射\n", .{});
-            // 使用对数映射而不是线性映射
-            const ambient_f = @as(f64, @floatFromInt(ambient_light));
-            var mapped_brightness: i64 = undefined;
-            if (ambient_light < 1) {
-                mapped_brightness = self.config.min_brightness;
-            } else {
-                // 使用对数函数进行映射，提供更好的低光照响应
-                const log_ambient = std.math.log(f64, std.math.e, ambient_f);
-                const brightness_range = @as(f64, @floatFromInt(self.config.max_brightness - self.config.min_brightness));
-                const min_brightness_f = @as(f64, @floatFromInt(self.config.min_brightness));
-
-                mapped_brightness = @as(i64, @intFromFloat((log_ambient / std.math.log(f64, std.math.e, @as(f64, @floatFromInt(self.config.max_ambient_light)))) * brightness_range + min_brightness_f));
-            }
-            std.debug.print("使用对数映射，映射值：{d}\n", .{mapped_brightness});
-            return @as(i64, mapped_brightness);
+        const main_prediction = main_bin.getWeightedAverage() orelse {
+            const mapped_brightness = self.logMapBrightness(ambient_light);
+            std.log.debug("主区间无数据，使用对数映射，映射值：{d}", .{mapped_brightness});
+            return mapped_brightness;
         };
 
         // 应用时间和活动状态的调整因子
-        const time_features = TimeFeatures.fromTimestamp(std.time.timestamp());
-        const time_factor: f64 = if (time_features.is_day) 1.0 else 0.8;
-        const activity_factor: f64 = if (is_active) 1.0 else 0.9;
-
         var adjusted_prediction = main_prediction * time_factor * activity_factor;
 
         // 区间边界插值
-        const bin_size = self.ambient_bins[1].min_value - self.ambient_bins[0].min_value;
-        const position_in_bin = @as(f64, @floatFromInt(ambient_light - main_bin.?.min_value)) / @as(f64, @floatFromInt(bin_size));
+        const position_in_bin = @as(f64, @floatFromInt(ambient_light - main_bin.min_value)) * self.bin_inv_widths[main_bin_index];
 
         if (position_in_bin < 0.2 or position_in_bin > 0.8) {
             if (main_bin_index > 0 and main_bin_index < self.ambient_bins.len - 1) {
@@ -291,28 +582,414 @@ pub const BrightnessModel = struct {
         }
 
         // 滑动平均平滑
-        var self_mut = @constCast(self);
-        self_mut.last_predictions[0] = self_mut.last_predictions[1];
-        self_mut.last_predictions[1] = self_mut.last_predictions[2];
-        self_mut.last_predictions[2] = adjusted_prediction;
-        return @as(i64, @intFromFloat((self_mut.last_predictions[0] + self_mut.last_predictions[1] + self_mut.last_predictions[2]) / 3.0));
+        const slot = &self.last_predictions[self.last_prediction_index];
+        self.last_predictions_sum += adjusted_prediction - slot.*;
+        slot.* = adjusted_prediction;
+        self.last_prediction_index = (self.last_prediction_index + 1) % smoothing_window;
+        // 每轮回绕时重新求和一次，避免增量维护的浮点误差在守护进程中长期累积
+        if (self.last_prediction_index == 0) {
+            var sum: f64 = 0;
+            for (self.last_predictions) |prediction| sum += prediction;
+            self.last_predictions_sum = sum;
+        }
+        return @as(i64, @intFromFloat(self.last_predictions_sum / smoothing_window));
     }
 
     /// 清理过期数据
     pub fn cleanup(self: *BrightnessModel, current_timestamp: i64) void {
         const max_age = 7 * 24 * 3600; // 一周
         for (self.ambient_bins) |*bin| {
-            var i: usize = 0;
-            while (i < bin.points.items.len) {
-                const point = bin.points.items[i];
-                const age = current_timestamp - point.timestamp;
-                if (age > max_age) {
-                    bin.total_weight -= point.weight;
-                    _ = bin.points.orderedRemove(i);
-                } else {
-                    i += 1;
-                }
+            bin.cleanup(current_timestamp, max_age);
+        }
+        self.refreshLatest();
+    }
+};
+
+/// 测试用的朴素实现：用列表保存数据点，每次线性扫描
+const NaiveBin = struct {
+    const Entry = struct {
+        point: WeightedDataPoint,
+        sequence: u64,
+    };
+
+    entries: std.ArrayList(Entry),
+
+    fn init(allocator: std.mem.Allocator) NaiveBin {
+        return .{ .entries = std.ArrayList(Entry).init(allocator) };
+    }
+
+    fn deinit(self: *NaiveBin) void {
+        self.entries.deinit();
+    }
+
+    fn update(self: *NaiveBin, brightness: i64, weight: f64, timestamp: i64, sequence: u64) !void {
+        const entry = Entry{
+            .point = .{ .brightness = brightness, .weight = weight, .timestamp = timestamp },
+            .sequence = sequence,
+        };
+        if (self.entries.items.len < AdaptiveBin.max_points) {
+            try self.entries.append(entry);
+            return;
+        }
+        var min_index: usize = 0;
+        for (self.entries.items, 0..) |e, i| {
+            const min = self.entries.items[min_index];
+            if (e.point.weight < min.point.weight or
+                (e.point.weight == min.point.weight and e.sequence < min.sequence))
+            {
+                min_index = i;
+            }
+        }
+        if (weight < self.entries.items[min_index].point.weight) return;
+        self.entries.items[min_index] = entry;
+    }
+
+    fn latestPoint(self: *const NaiveBin) ?WeightedDataPoint {
+        var latest: ?Entry = null;
+        for (self.entries.items) |e| {
+            if (latest == null or e.point.timestamp > latest.?.point.timestamp or
+                (e.point.timestamp == latest.?.point.timestamp and e.sequence > latest.?.sequence))
+            {
+                latest = e;
             }
         }
+        return if (latest) |e| e.point else null;
+    }
+
+    fn getWeightedAverage(self: *const NaiveBin) ?f64 {
+        if (self.entries.items.len == 0) return null;
+        var sum: f64 = 0;
+        var total: f64 = 0;
+        for (self.entries.items) |e| {
+            sum += @as(f64, @floatFromInt(e.point.brightness)) * e.point.weight;
+            total += e.point.weight;
+        }
+        return sum / total;
+    }
+
+    fn cleanup(self: *NaiveBin, current_timestamp: i64, max_age: i64) void {
+        var kept: usize = 0;
+        for (self.entries.items) |e| {
+            if (current_timestamp - e.point.timestamp > max_age) continue;
+            self.entries.items[kept] = e;
+            kept += 1;
+        }
+        self.entries.shrinkRetainingCapacity(kept);
     }
 };
+
+/// 以相同的插入序号向两种实现插入同一个数据点
+fn updateBoth(bin: *AdaptiveBin, naive: *NaiveBin, sequence: *u64, brightness: i64, weight: f64, timestamp: i64) !void {
+    bin.update(brightness, weight, timestamp, sequence.*);
+    try naive.update(brightness, weight, timestamp, sequence.*);
+    sequence.* += 1;
+}
+
+fn lessPoint(_: void, a: WeightedDataPoint, b: WeightedDataPoint) bool {
+    if (a.timestamp != b.timestamp) return a.timestamp < b.timestamp;
+    if (a.brightness != b.brightness) return a.brightness < b.brightness;
+    return a.weight < b.weight;
+}
+
+/// 检查堆性质，并与朴素实现比较数据点集合、最新点和加权平均
+fn expectSameBin(bin: *const AdaptiveBin, naive: *const NaiveBin) !void {
+    const testing = std.testing;
+
+    for (1..@max(bin.len, 1)) |i| {
+        try testing.expect(!bin.less(i, (i - 1) / 2));
+    }
+
+    try testing.expectEqual(naive.entries.items.len, bin.len);
+    var actual: [AdaptiveBin.max_points]WeightedDataPoint = undefined;
+    var expected: [AdaptiveBin.max_points]WeightedDataPoint = undefined;
+    for (0..bin.len) |i| {
+        actual[i] = .{ .brightness = bin.brightness[i], .weight = bin.weights[i], .timestamp = bin.timestamps[i] };
+        expected[i] = naive.entries.items[i].point;
+    }
+    std.mem.sort(WeightedDataPoint, actual[0..bin.len], {}, lessPoint);
+    std.mem.sort(WeightedDataPoint, expected[0..bin.len], {}, lessPoint);
+    try testing.expectEqualSlices(WeightedDataPoint, expected[0..bin.len], actual[0..bin.len]);
+
+    try testing.expectEqual(naive.latestPoint(), bin.latestPoint());
+
+    if (naive.getWeightedAverage()) |average| {
+        try testing.expectApproxEqRel(average, bin.getWeightedAverage().?, 1e-9);
+    } else {
+        try testing.expectEqual(@as(?f64, null), bin.getWeightedAverage());
+    }
+}
+
+test "AdaptiveBin 权重相同时先淘汰最早加入的点" {
+    var bin = AdaptiveBin.init(0, 100);
+    var naive = NaiveBin.init(std.testing.allocator);
+    defer naive.deinit();
+    var sequence: u64 = 0;
+
+    for (0..AdaptiveBin.max_points + 10) |i| {
+        const value: i64 = @intCast(i);
+        try updateBoth(&bin, &naive, &sequence, value, 1.0, value);
+        try expectSameBin(&bin, &naive);
+    }
+
+    // 最早加入的 10 个点被淘汰
+    for (0..bin.len) |i| {
+        try std.testing.expect(bin.brightness[i] >= 10);
+    }
+}
+
+test "AdaptiveBin 淘汰缓存的最新点后重新选出最新点" {
+    var bin = AdaptiveBin.init(0, 100);
+    var naive = NaiveBin.init(std.testing.allocator);
+    defer naive.deinit();
+    var sequence: u64 = 0;
+
+    // 最新的点权重最小，区间满后首先被淘汰
+    try updateBoth(&bin, &naive, &sequence, 100, 0.5, 1000);
+    for (0..AdaptiveBin.max_points - 1) |i| {
+        const value: i64 = @intCast(i);
+        try updateBoth(&bin, &naive, &sequence, value, 2.0, value);
+    }
+    try expectSameBin(&bin, &naive);
+    try std.testing.expectEqual(@as(i64, 1000), bin.latestPoint().?.timestamp);
+
+    try updateBoth(&bin, &naive, &sequence, 7, 1.0, 10);
+    try expectSameBin(&bin, &naive);
+    try std.testing.expectEqual(@as(i64, AdaptiveBin.max_points - 2), bin.latestPoint().?.timestamp);
+
+    // 时间戳相同时取较晚加入的点
+    try updateBoth(&bin, &naive, &sequence, 8, 1.0, AdaptiveBin.max_points - 2);
+    try expectSameBin(&bin, &naive);
+    try std.testing.expectEqual(@as(i64, 8), bin.latestPoint().?.brightness);
+}
+
+test "AdaptiveBin cleanup 后重建堆，结果与朴素实现一致" {
+    var bin = AdaptiveBin.init(0, 100);
+    var naive = NaiveBin.init(std.testing.allocator);
+    defer naive.deinit();
+    var sequence: u64 = 0;
+
+    var prng = std.Random.DefaultPrng.init(0x5eed);
+    const random = prng.random();
+
+    var timestamp: i64 = 0;
+    for (0..2000) |round| {
+        timestamp += random.intRangeAtMost(i64, 0, 3);
+        const brightness = random.intRangeAtMost(i64, 0, 100);
+        // 权重取少数几个离散值，以覆盖大量权重相同的情况
+        const weight = @as(f64, @floatFromInt(random.intRangeAtMost(u8, 1, 4))) * 0.25;
+        try updateBoth(&bin, &naive, &sequence, brightness, weight, timestamp);
+
+        if (round % 97 == 96) {
+            bin.cleanup(timestamp, 40);
+            naive.cleanup(timestamp, 40);
+        }
+        try expectSameBin(&bin, &naive);
+    }
+
+    // 全部过期后区间为空
+    bin.cleanup(timestamp + 1000, 40);
+    naive.cleanup(timestamp + 1000, 40);
+    try expectSameBin(&bin, &naive);
+}
+
+test "BrightnessModel 最新点时间戳相同时取较晚加入的点" {
+    var model = try BrightnessModel.init(std.testing.allocator, .{}, 0, 1000, 10);
+    defer model.deinit();
+
+    const timestamp = 1000;
+    const points = [_]DataPoint{
+        .{ .timestamp = timestamp, .ambient_light = 50, .screen_brightness = 100, .is_manual_adjustment = true },
+        .{ .timestamp = timestamp, .ambient_light = 950, .screen_brightness = 150, .is_manual_adjustment = true },
+        .{ .timestamp = timestamp, .ambient_light = 450, .screen_brightness = 120, .is_manual_adjustment = true },
+    };
+    for (points) |point| {
+        try model.train(point, timestamp, true);
+        try std.testing.expectEqual(point.screen_brightness, model.latestPoint().?.screen_brightness);
+    }
+}
+
+/// 直接遍历所有区间中的数据点得到最新点，不依赖任何缓存
+fn scanLatestPoint(model: *const BrightnessModel) ?DataPoint {
+    var latest: ?DataPoint = null;
+    var latest_sequence: u64 = 0;
+    for (model.ambient_bins) |*bin| {
+        for (0..bin.len) |i| {
+            if (latest) |point| {
+                if (bin.timestamps[i] < point.timestamp) continue;
+                if (bin.timestamps[i] == point.timestamp and bin.sequences[i] < latest_sequence) continue;
+            }
+            latest = .{
+                .timestamp = bin.timestamps[i],
+                .ambient_light = bin.brightness[i],
+                .screen_brightness = bin.brightness[i],
+                .is_manual_adjustment = true,
+            };
+            latest_sequence = bin.sequences[i];
+        }
+    }
+    return latest;
+}
+
+fn expectSameModel(expected: *const BrightnessModel, actual: *const BrightnessModel) !void {
+    const testing = std.testing;
+    for (expected.ambient_bins, actual.ambient_bins) |*e, *a| {
+        try testing.expectEqual(e.len, a.len);
+        try testing.expectEqualSlices(i64, e.brightness[0..e.len], a.brightness[0..a.len]);
+        try testing.expectEqualSlices(f64, e.weights[0..e.len], a.weights[0..a.len]);
+        try testing.expectEqualSlices(i64, e.timestamps[0..e.len], a.timestamps[0..a.len]);
+        try testing.expectEqualSlices(u64, e.sequences[0..e.len], a.sequences[0..a.len]);
+        try testing.expectEqual(e.total_weight, a.total_weight);
+        try testing.expectEqual(e.weighted_sum, a.weighted_sum);
+    }
+    try testing.expectEqual(expected.latestPoint(), actual.latestPoint());
+}
+
+test "BrightnessModel trainBatch 与逐条 train 结果一致" {
+    const allocator = std.testing.allocator;
+    var batch_model = try BrightnessModel.init(allocator, .{}, 0, 1000, 10);
+    defer batch_model.deinit();
+    var single_model = try BrightnessModel.init(allocator, .{}, 0, 1000, 10);
+    defer single_model.deinit();
+
+    var prng = std.Random.DefaultPrng.init(0xbee);
+    const random = prng.random();
+
+    // 固定按 UTC 计算时间特征。当前时刻为中午，最新的数据点都在夜间，
+    // 权重较小，容易被淘汰，以覆盖全局最新点被淘汰后重新遍历的情况
+    for ([_]*BrightnessModel{ &batch_model, &single_model }) |model| {
+        model.utc_offset = 0;
+        model.utc_offset_expires = std.math.maxInt(i64);
+    }
+    const current_timestamp: i64 = 20000 * 24 * 3600 + 12 * 3600;
+    var timestamp: i64 = current_timestamp;
+
+    // 分两批训练，中间执行一次 cleanup
+    for (0..2) |_| {
+        var points = std.MultiArrayList(DataPoint){};
+        defer points.deinit(allocator);
+        for (0..2000) |_| {
+            // 时间戳乱序且不时重复
+            if (random.uintLessThan(u8, 4) != 0) {
+                timestamp = current_timestamp - random.intRangeAtMost(i64, 8 * 3600, 3 * 24 * 3600);
+            }
+            try points.append(allocator, .{
+                .timestamp = timestamp,
+                .ambient_light = random.intRangeAtMost(i64, 0, 999),
+                // 偶尔出现亮度突变的异常点
+                .screen_brightness = if (random.uintLessThan(u8, 20) == 0) 400 else random.intRangeAtMost(i64, 100, 170),
+                .is_manual_adjustment = random.uintLessThan(u8, 10) != 0,
+            });
+        }
+
+        const slice = points.slice();
+        _ = batch_model.trainBatch(slice, current_timestamp);
+        for (0..slice.len) |i| {
+            const point = slice.get(i);
+            const is_active = (current_timestamp - point.timestamp) < single_model.config.activity_timeout;
+            try single_model.train(point, current_timestamp, is_active);
+            try std.testing.expectEqual(scanLatestPoint(&single_model), single_model.latestPoint());
+        }
+        try expectSameModel(&single_model, &batch_model);
+
+        batch_model.cleanup(current_timestamp + 2 * 24 * 3600);
+        single_model.cleanup(current_timestamp + 2 * 24 * 3600);
+        try std.testing.expectEqual(scanLatestPoint(&single_model), single_model.latestPoint());
+        try expectSameModel(&single_model, &batch_model);
+    }
+}
+
+test "BrightnessModel 跨过刷新时刻后重新获取时区偏移" {
+    var model = try BrightnessModel.init(std.testing.allocator, .{}, 0, 1000, 10);
+    defer model.deinit();
+
+    const timestamp: i64 = 1_792_022_400 + 100;
+    model.utc_offset = 12345;
+    model.utc_offset_expires = timestamp + 1;
+    _ = model.currentTimeFeatures(timestamp);
+    try std.testing.expectEqual(@as(i64, 12345), model.utc_offset);
+
+    _ = model.currentTimeFeatures(timestamp + 1);
+    try std.testing.expectEqual(localUtcOffset(timestamp + 1), model.utc_offset);
+    try std.testing.expectEqual(@as(i64, 1_792_022_400 + 15 * 60), model.utc_offset_expires);
+}
+
+test "BrightnessModel 映射值超出区间范围时 predict 返回 null" {
+    var model = try BrightnessModel.init(std.testing.allocator, .{}, 0, 1000, 10);
+    defer model.deinit();
+
+    // sigmoid 映射值在 [0.5, 1) 内，落在默认的首区间 [0, 100)
+    try std.testing.expect(model.predict(500, true) != null);
+
+    var ambient: [20]i64 = undefined;
+    for (&ambient, 0..) |*value, i| value.* = 100 + @as(i64, @intCast(i)) * 10;
+    try model.adaptBins(&ambient);
+    const last_predictions = model.last_predictions;
+    try std.testing.expectEqual(@as(?i64, null), model.predict(500, true));
+    // 预测失败不影响滑动平均状态
+    try std.testing.expectEqual(last_predictions, model.last_predictions);
+}
+
+test "BrightnessModel adaptBins 在大量重复值下生成首尾相接且严格递增的边界" {
+    var model = try BrightnessModel.init(std.testing.allocator, .{}, 0, 1000, 10);
+    defer model.deinit();
+
+    // 大部分为 0 lux，另有少量重复的亮值
+    var ambient: [200]i64 = undefined;
+    for (&ambient, 0..) |*value, i| {
+        value.* = if (i < 170) 0 else if (i < 190) 50 else @as(i64, @intCast(i));
+    }
+    // 全部相同的极端情况
+    const all_same = [_]i64{42} ** 30;
+
+    for ([_][]const i64{ &ambient, &all_same }) |historical| {
+        try model.adaptBins(historical);
+        for (model.ambient_bins, 0..) |bin, i| {
+            try std.testing.expect(bin.min_value < bin.max_value);
+            if (i > 0) {
+                try std.testing.expect(model.bin_edges[i - 1] < model.bin_edges[i]);
+                try std.testing.expectEqual(model.ambient_bins[i - 1].max_value, bin.min_value);
+            }
+            // 每个区间都可以命中
+            try std.testing.expectEqual(i, model.findBinIndex(@floatFromInt(bin.min_value)));
+            try std.testing.expectEqual(i, model.findBinIndex(@floatFromInt(bin.max_value - 1)));
+        }
+    }
+}
+
+test "BrightnessModel predictMany 与逐个 predict 结果及滑动平均状态一致" {
+    const allocator = std.testing.allocator;
+    var model = try BrightnessModel.init(allocator, .{}, 0, 1000, 10);
+    defer model.deinit();
+
+    const lanes = std.simd.suggestVectorLength(f64) orelse 1;
+    // 长度不是向量宽度的整数倍，覆盖末尾不满一个向量的分块
+    var ambient_lights: [3 * lanes + 1]i64 = undefined;
+    for (&ambient_lights, 0..) |*ambient, i| ambient.* = @as(i64, @intCast(i)) * 37 - 20;
+
+    // 先用空模型（对数映射）比较，再训练后比较
+    for (0..2) |round| {
+        if (round == 1) {
+            for (0..100) |i| {
+                const value: i64 = @intCast(i);
+                try model.train(.{
+                    .timestamp = 1_800_000_000 + value,
+                    .ambient_light = value,
+                    .screen_brightness = 6000 + @mod(value * 7, 50),
+                    .is_manual_adjustment = true,
+                }, 1_800_000_000 + 100, true);
+            }
+        }
+
+        // 预测只修改滑动平均状态，区间数据可以共享
+        var batch = model;
+        var single = model;
+        var batch_results: [ambient_lights.len]?i64 = undefined;
+        batch.predictMany(&ambient_lights, false, &batch_results);
+        for (ambient_lights, batch_results) |ambient, result| {
+            try std.testing.expectEqual(single.predict(ambient, false), result);
+        }
+        try std.testing.expectEqual(single.last_predictions, batch.last_predictions);
+        try std.testing.expectEqual(single.last_prediction_index, batch.last_prediction_index);
+        try std.testing.expectEqual(single.last_predictions_sum, batch.last_predictions_sum);
+    }
+}
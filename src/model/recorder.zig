@@ -8,15 +8,88 @@ pub const DataPoint = struct {
     is_manual_adjustment: bool,
 };
 
+/// 数据落盘策略：决定多久调用一次 fsync。
+/// 无论哪种策略，每条数据都会立即写入内核，进程被终止也不会丢失，
+/// 策略只影响断电时可能丢失的数据量。
+pub const FsyncPolicy = union(enum) {
+    /// 从不主动 fsync，仅在关闭时同步
+    never,
+    /// 每记录 N 条数据后 fsync 一次
+    every_n: u32,
+    /// 由后台线程每隔指定秒数 fsync 一次
+    interval: u32,
+};
+
+/// 只同步文件数据（fdatasync）。日志文件只追加写入，
+/// 不需要像 fsync 那样额外刷新 mtime 等元数据。
+fn syncData(file: std.fs.File) posix.SyncError!void {
+    return posix.fdatasync(file.handle);
+}
+
+/// interval 策略使用的后台同步线程
+const Flusher = struct {
+    thread: std.Thread,
+    state: *State,
+
+    /// 与后台线程共享的状态，分配在堆上以保证 DataLogger 被复制后地址不变
+    const State = struct {
+        stop: std.Thread.ResetEvent = .{},
+        dirty: std.atomic.Value(bool) = std.atomic.Value(bool).init(false),
+    };
+
+    fn start(allocator: std.mem.Allocator, file: std.fs.File, seconds: u32) !Flusher {
+        const state = try allocator.create(State);
+        errdefer allocator.destroy(state);
+        state.* = .{};
+        const interval_ns = @as(u64, @max(seconds, 1)) * std.time.ns_per_s;
+        const thread = try std.Thread.spawn(.{}, run, .{ file, interval_ns, state });
+        return .{ .thread = thread, .state = state };
+    }
+
+    fn stop(self: *Flusher, allocator: std.mem.Allocator) void {
+        self.state.stop.set();
+        self.thread.join();
+        allocator.destroy(self.state);
+    }
+
+    fn run(file: std.fs.File, interval_ns: u64, state: *State) void {
+        while (true) {
+            state.stop.timedWait(interval_ns) catch {
+                if (state.dirty.swap(false, .acq_rel)) {
+                    syncData(file) catch |err| {
+                        std.log.err("后台同步数据文件失败: {}", .{err});
+                    };
+                }
+                continue;
+            };
+            return;
+        }
+    }
+};
+
 pub const DataLogger = struct {
     const Self = @This();
 
+    /// 读取时单行 CSV 的缓冲区大小
+    const line_buffer_size = 1024;
+    /// 一行数据格式化后的最大长度
+    const max_line_length = std.fmt.comptimePrint("{},{},{},1\n", .{
+        std.math.minInt(i64),
+        std.math.minInt(i64),
+        std.math.minInt(i64),
+    }).len;
+    /// 顺序读取 CSV 的缓冲区大小
+    const read_buffer_size = 64 * 1024;
+
     file: std.fs.File,
-    writer: std.fs.File.Writer,
     allocator: std.mem.Allocator,
     buffer: []u8,
+    fsync_policy: FsyncPolicy,
+    /// 自上次 fsync 以来记录的条数，只在 every_n 策略下计数
+    unsynced_count: u32 = 0,
+    flusher: ?Flusher = null,
 
-    pub fn init(allocator: std.mem.Allocator) !Self {
+    pub fn init(allocator: std.mem.Allocator, fsync_policy: FsyncPolicy) !Self {
         // 获取用户的配置目录
         const config_dir = blk: {
             if (posix.getenv("XDG_CONFIG_HOME")) |xdg_config| {
@@ -42,38 +115,62 @@ pub const DataLogger = struct {
         const log_path = try std.fs.path.join(allocator, &[_][]const u8{ config_dir, "brightness_data.csv" });
         defer allocator.free(log_path);
 
-        // 创建或打开日志文件
-        const file = try std.fs.createFileAbsolute(log_path, .{
-            .read = true,
-            .truncate = false,
-        });
+        // 以追加模式创建或打开日志文件：写入总是落在文件末尾，
+        // 读取历史数据移动文件指针也不会影响之后的写入
+        const file = std.fs.File{
+            .handle = try posix.open(log_path, .{
+                .ACCMODE = .RDWR,
+                .CREAT = true,
+                .APPEND = true,
+                .CLOEXEC = true,
+            }, std.fs.File.default_mode),
+        };
+        errdefer file.close();
 
         // 如果是新文件，写入CSV头
         const file_size = (try file.stat()).size;
         if (file_size == 0) {
             try file.writeAll("timestamp,ambient_light,screen_brightness,is_manual\n");
-        } else {
-            // 将文件指针移到末尾以追加数据
-            try file.seekFromEnd(0);
         }
 
+        const buffer = try allocator.alloc(u8, line_buffer_size);
+        errdefer allocator.free(buffer);
+
+        const flusher = switch (fsync_policy) {
+            .interval => |seconds| try Flusher.start(allocator, file, seconds),
+            else => null,
+        };
+
         return Self{
             .file = file,
-            .writer = file.writer(),
             .allocator = allocator,
-            .buffer = try allocator.alloc(u8, 1024),
+            .buffer = buffer,
+            .fsync_policy = fsync_policy,
+            .flusher = flusher,
         };
     }
 
     pub fn deinit(self: *Self) void {
+        if (self.flusher) |*flusher| {
+            flusher.stop(self.allocator);
+        }
+        self.sync() catch |err| {
+            std.log.err("关闭前同步数据文件失败: {}", .{err});
+        };
         self.file.close();
         self.allocator.free(self.buffer);
     }
 
+    /// 将已写入的数据落盘
+    pub fn sync(self: *Self) !void {
+        try syncData(self.file);
+        self.unsynced_count = 0;
+    }
+
     pub fn logDataPoint(self: *Self, data: DataPoint) !void {
-        // 格式化数据点为CSV行
+        var line_buffer: [max_line_length]u8 = undefined;
         const line = try std.fmt.bufPrint(
-            self.buffer,
+            &line_buffer,
             "{},{},{},{}\n",
             .{
                 data.timestamp,
@@ -83,39 +180,67 @@ pub const DataLogger = struct {
             },
         );
 
-        // 写入文件
-        try self.writer.writeAll(line);
-        try self.file.sync(); // 确保数据被写入磁盘
+        // 守护进程通常被信号直接终止而不会执行 deinit，因此每条数据都立即写入内核；
+        // 只有 fsync 按策略批量进行，避免每条数据都触发一次磁盘屏障
+        try self.file.writeAll(line);
+        switch (self.fsync_policy) {
+            .never => {},
+            .every_n => |n| {
+                self.unsynced_count += 1;
+                if (self.unsynced_count >= n) try self.sync();
+            },
+            .interval => self.flusher.?.state.dirty.store(true, .release),
+        }
     }
 
-    pub fn readHistoricalData(self: *Self) ![]DataPoint {
-        var data = std.ArrayList(DataPoint).init(self.allocator);
-        errdefer data.deinit();
+    /// 逐行读取历史数据的迭代器，不需要一次性把全部数据载入内存
+    pub const HistoryIterator = struct {
+        buf_reader: std.io.BufferedReader(read_buffer_size, std.fs.File.Reader),
+        line_buffer: []u8,
+
+        pub fn next(self: *HistoryIterator) !?DataPoint {
+            const reader = self.buf_reader.reader();
+            while (try reader.readUntilDelimiterOrEof(self.line_buffer, '\n')) |line| {
+                var iter = std.mem.splitScalar(u8, line, ',');
+
+                const timestamp = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
+                const ambient = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
+                const brightness = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
+                const manual_value = try std.fmt.parseInt(u8, iter.next() orelse continue, 10);
+
+                return DataPoint{
+                    .timestamp = timestamp,
+                    .ambient_light = ambient,
+                    .screen_brightness = brightness,
+                    .is_manual_adjustment = manual_value != 0,
+                };
+            }
+            return null;
+        }
+    };
 
+    /// 从头开始遍历历史数据。迭代器借用 DataLogger 的行缓冲区，遍历期间不要记录新数据。
+    pub fn iterHistoricalData(self: *Self) !HistoryIterator {
         try self.file.seekTo(0);
-        var buf_reader = std.io.bufferedReader(self.file.reader());
-        var reader = buf_reader.reader();
+        var it = HistoryIterator{
+            .buf_reader = std.io.bufferedReaderSize(read_buffer_size, self.file.reader()),
+            .line_buffer = self.buffer,
+        };
 
         // 跳过CSV头
-        _ = try reader.readUntilDelimiterOrEof(self.buffer, '\n');
-
-        // 读取所有数据行
-        while (try reader.readUntilDelimiterOrEof(self.buffer, '\n')) |line| {
-            var iter = std.mem.splitScalar(u8, line, ',');
-
-            const timestamp = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
-            const ambient = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
-            const brightness = try std.fmt.parseInt(i64, iter.next() orelse continue, 10);
-            const manual_value = try std.fmt.parseInt(u8, iter.next() orelse continue, 10);
-
-            try data.append(DataPoint{
-                .timestamp = timestamp,
-                .ambient_light = ambient,
-                .screen_brightness = brightness,
-                .is_manual_adjustment = manual_value != 0,
-            });
-        }
+        _ = try it.buf_reader.reader().readUntilDelimiterOrEof(self.buffer, '\n');
+        return it;
+    }
+
+    /// 读取全部历史数据，按列（SoA）存放，调用者负责 `deinit`
+    pub fn readHistoricalData(self: *Self) !std.MultiArrayList(DataPoint) {
+        var data = std.MultiArrayList(DataPoint){};
+        errdefer data.deinit(self.allocator);
 
-        return data.toOwnedSlice();
+        var it = try self.iterHistoricalData();
+        while (try it.next()) |data_point| {
+            try data.append(self.allocator, data_point);
+        }
+        return data;
     }
 };